@@ -10,7 +10,7 @@ from auth import get_current_user
 from dbmodels import User, Tx
 
 # Import shared engine to avoid circular import
-from database import engine
+from database import get_engine
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
 
@@ -21,7 +21,7 @@ def get_summary(
     user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Get overall financial summary for date range"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get all transactions in date range
         transactions = session.exec(
             select(Tx).where(
@@ -65,7 +65,7 @@ def get_category_breakdown(
     user: User = Depends(get_current_user)
 ) -> List[Dict[str, Any]]:
     """Get spending breakdown by category"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         transactions = session.exec(
             select(Tx).where(
                 Tx.user_id == user.id,
@@ -104,7 +104,7 @@ def get_trends(
     user: User = Depends(get_current_user)
 ) -> List[Dict[str, Any]]:
     """Get income/expense trends over time"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         transactions = session.exec(
             select(Tx).where(
                 Tx.user_id == user.id,
@@ -174,7 +174,7 @@ def get_comparison(
     user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Compare two time periods"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get current period data
         current_txs = session.exec(
             select(Tx).where(
@@ -230,7 +230,7 @@ def get_patterns(
     user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Analyze spending patterns"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         transactions = session.exec(
             select(Tx).where(
                 Tx.user_id == user.id,
@@ -307,7 +307,7 @@ def get_budget_performance(
     user: User = Depends(get_current_user)
 ) -> List[Dict[str, Any]]:
     """Get budget vs actual performance over time"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get all budget goals in the date range
         from dbmodels import BudgetGoal
         
@@ -366,7 +366,7 @@ def get_cashflow(
     user: User = Depends(get_current_user)
 ) -> Dict[str, Any]:
     """Get cash flow analysis"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         transactions = session.exec(
             select(Tx).where(
                 Tx.user_id == user.id,
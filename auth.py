@@ -9,7 +9,7 @@ import logging
 from dbmodels import User
 
 # Import shared engine to avoid circular import
-from database import engine
+from database import get_engine
 
 router = APIRouter()
 
@@ -33,7 +33,7 @@ def get_current_user(authorization: str = Header(None)) -> User:
         user_id = payload.get("user_id")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         user = s.get(User, user_id)
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -42,7 +42,7 @@ def get_current_user(authorization: str = Header(None)) -> User:
 
 @router.post("/register")
 def register(username: str = Form(...), password: str = Form(...)):
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         existing = s.exec(select(User).where(User.username == username)).first()
         if existing:
             raise HTTPException(status_code=400, detail="Username taken")
@@ -55,7 +55,7 @@ def register(username: str = Form(...), password: str = Form(...)):
 
 @router.post("/login")
 def login(username: str = Form(...), password: str = Form(...)):
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         user = s.exec(select(User).where(User.username == username)).first()
         if not user or not pwd_context.verify(password, user.password_hash):
             raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -75,7 +75,7 @@ def change_password(
     new_password: str = Body(...),
     user: User = Depends(get_current_user),
 ):
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         db_user = s.get(User, user.id)
         if not pwd_context.verify(current_password, db_user.password_hash):
             raise HTTPException(status_code=400, detail="Incorrect current password")
@@ -6,7 +6,7 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlmodel import Session, select, func
 from pydantic import BaseModel
-from database import engine
+from database import get_engine
 from auth import get_current_user
 from dbmodels import (
     User, Tx, CategoryBudget, BudgetAlert, SavingsGoal, Bill,
@@ -199,7 +199,7 @@ def apply_budget_template(
     
     template = BUDGET_TEMPLATES[template_id]
     
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Deactivate existing budgets
         existing = session.exec(
             select(CategoryBudget).where(
@@ -243,7 +243,7 @@ def get_category_budgets(
     user: User = Depends(get_current_user)
 ):
     """Get all active category budgets with spending info"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get active budgets
         query = select(CategoryBudget).where(
             CategoryBudget.user_id == user.id,
@@ -297,7 +297,7 @@ def create_category_budget(
     user: User = Depends(get_current_user)
 ):
     """Create a new category budget"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Check if budget already exists for this category
         existing = session.exec(
             select(CategoryBudget).where(
@@ -341,7 +341,7 @@ def get_budget_analysis(
     user: User = Depends(get_current_user)
 ):
     """Get comprehensive budget analysis"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get all category budgets for the period
         category_budgets = get_category_budgets(period, user)
         
@@ -387,7 +387,7 @@ def get_bills(
     user: User = Depends(get_current_user)
 ):
     """Get all bills with upcoming due dates"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         bills = session.exec(
             select(Bill).where(
                 Bill.user_id == user.id,
@@ -436,7 +436,7 @@ def create_bill(
     user: User = Depends(get_current_user)
 ):
     """Create a new bill reminder"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         bill = Bill(
             user_id=user.id,
             **bill_data.dict()
@@ -453,7 +453,7 @@ def get_savings_goals(
     user: User = Depends(get_current_user)
 ):
     """Get all savings goals with progress"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         query = select(SavingsGoal).where(SavingsGoal.user_id == user.id)
         
         if active_only:
@@ -488,7 +488,7 @@ def create_savings_goal(
     user: User = Depends(get_current_user)
 ):
     """Create a new savings goal"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         goal = SavingsGoal(
             user_id=user.id,
             **goal_data.dict()
@@ -506,7 +506,7 @@ def contribute_to_goal(
     user: User = Depends(get_current_user)
 ):
     """Add contribution to savings goal"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         goal = session.exec(
             select(SavingsGoal).where(
                 SavingsGoal.id == goal_id,
@@ -544,7 +544,7 @@ def mark_bill_paid(
     user: User = Depends(get_current_user)
 ):
     """Mark a bill as paid"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         bill = session.exec(
             select(Bill).where(
                 Bill.id == bill_id,
@@ -579,7 +579,7 @@ def get_budget_alerts(
     user: User = Depends(get_current_user)
 ):
     """Get active budget alerts"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get category budgets
         budgets = get_category_budgets(None, user)
         
@@ -2,8 +2,77 @@
 Shared database configuration to avoid circular imports
 """
 import os
-from sqlmodel import create_engine
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+from sqlmodel import SQLModel, create_engine
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+def enable_sqlite_pragmas(sqlite_engine) -> None:
+    """Apply SQLITE_PRAGMAS to every new connection of a SQLite engine
+
+    WAL with synchronous=NORMAL appends commits to the log instead of
+    fsyncing the database file; in-memory databases keep their own journal.
+    """
+    @event.listens_for(sqlite_engine, "connect")
+    def _set_pragmas(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
 
 # Single source of truth for database configuration
 DB_URL = os.getenv("DATABASE_URL", "sqlite:///budgeteer.db")
-engine = create_engine(DB_URL, echo=False)
\ No newline at end of file
+engine = create_engine(DB_URL, echo=False)
+if engine.dialect.name == "sqlite":
+    enable_sqlite_pragmas(engine)
+
+
+def get_engine():
+    """The shared engine, looked up at call time so it can be swapped (e.g. in tests)"""
+    return engine
+
+_SCHEMA_LOCK_PATH = os.path.join(tempfile.gettempdir(), "budgeteer-schema.lock")
+
+
+@contextmanager
+def _schema_lock():
+    """Serialize schema creation across worker processes on the same host"""
+    if fcntl is None:
+        yield
+        return
+    with open(_SCHEMA_LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def create_db_and_tables() -> None:
+    """Create any missing tables and upgrade existing ones; safe to call
+    from several workers at once"""
+    import dbmodels  # noqa: F401 - register all tables on SQLModel.metadata
+    from migrate import upgrade_schema
+
+    with _schema_lock():
+        SQLModel.metadata.create_all(engine)
+        upgrade_schema(engine)
+
+
+def should_create_tables() -> bool:
+    """Whether app startup should create tables (deploys run migrate.py instead)"""
+    return os.getenv("RUN_MIGRATIONS", "1") == "1"
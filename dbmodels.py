@@ -1,6 +1,6 @@
 from typing import Optional, List
 from datetime import date, datetime
-from sqlmodel import SQLModel, Field, JSON, Column
+from sqlmodel import SQLModel, Field, JSON, Column, Index, UniqueConstraint
 from enum import Enum
 
 class User(SQLModel, table=True):
@@ -9,13 +9,19 @@ class User(SQLModel, table=True):
     password_hash: str
 
 class Tx(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_tx_user_date_label", "user_id", "tx_date", "label"),
+        # Series lookups, edits and deletes (all filter on user and series)
+        Index("ix_tx_user_series_date", "user_id", "series_id", "tx_date"),
+    )
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     tx_date: date
     amount: float
     label: str
     notes: Optional[str] = None
     recurring: bool = False
-    series_id: Optional[int] = Field(default=None, index=True)
+    series_id: Optional[int] = None
     user_id: Optional[int] = Field(default=None, foreign_key="user.id")
 
 class BudgetGoal(SQLModel, table=True):
@@ -79,6 +85,7 @@ class UserPreferences(SQLModel, table=True):
     quiet_hours_start: Optional[int] = None  # Hour of day (0-23)
     quiet_hours_end: Optional[int] = None
     peer_comparison_opt_in: bool = True
+    last_digest_sent_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -91,6 +98,8 @@ class FinancialHealthScore(SQLModel, table=True):
     calculated_at: datetime = Field(default_factory=datetime.utcnow)
     
 class SpendingBenchmark(SQLModel, table=True):
+    __table_args__ = (UniqueConstraint("category", "user_demographic"),)
+    
     id: Optional[int] = Field(default=None, primary_key=True)
     category: str
     user_demographic: Optional[str] = None  # e.g., "student", "young_professional"
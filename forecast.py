@@ -3,7 +3,6 @@ import os
 from typing import List
 from functools import lru_cache
 
-import pandas as pd
 import numpy as np
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select, create_engine
@@ -18,13 +17,20 @@ except ImportError:
     print("Warning: ML libraries not available, using simple forecasting")
 
 # Import shared engine to avoid circular import
-from database import engine
+from database import get_engine
 
 router = APIRouter()
 
+# One PCG64 generator per process; a single batched draw replaces the
+# per-simulation calls into the legacy global RandomState.
+_RNG = np.random.default_rng()
+
 
 def _forecast_cached(user_id: int, days: int, model: str, last_ts: float):
-    with Session(engine) as s:
+    # pandas is only needed here; importing it lazily keeps it off app startup
+    import pandas as pd
+
+    with Session(get_engine()) as s:
         txs = s.exec(select(Tx).where(Tx.user_id == user_id)).all()
         df = pd.DataFrame([{"tx_date": t.tx_date, "amount": t.amount} for t in txs])
         df = df.groupby("tx_date")["amount"].sum().sort_index()
@@ -86,11 +92,9 @@ def _forecast_cached(user_id: int, days: int, model: str, last_ts: float):
             mu = float(daily.mean())
             sigma = float(daily.std()) if daily.std() else 0.0
             last_balance = float(running.iloc[-1])
-            sims = []
-            for _ in range(100):
-                steps = np.random.normal(mu, sigma, days)
-                sims.append(np.cumsum(steps) + last_balance)
-            preds = np.mean(sims, axis=0)
+            steps = _RNG.normal(mu, sigma, size=(100, days))
+            sims = np.cumsum(steps, axis=1) + last_balance
+            preds = sims.mean(axis=0)
         else:
             from sklearn.linear_model import LinearRegression
 
@@ -111,7 +115,7 @@ def cached_forecast(user_id: int, days: int, model: str, last_ts: float):
 
 @router.get("/forecast")
 def get_forecast(days: int = 7, model: str = "linear", user=Depends(get_current_user)):
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         txs = s.exec(select(Tx).where(Tx.user_id == user.id)).all()
         if not txs:
             raise HTTPException(status_code=404, detail="No transactions")
@@ -123,7 +127,7 @@ def get_forecast(days: int = 7, model: str = "linear", user=Depends(get_current_
 @router.get("/goal")
 def get_goal(user=Depends(get_current_user)):
     month_start = date.today().replace(day=1)
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         goal = s.exec(
             select(BudgetGoal).where(
                 BudgetGoal.user_id == user.id,
@@ -150,7 +154,7 @@ def get_goal(user=Depends(get_current_user)):
 @router.post("/goal")
 def set_goal(amount: float, user=Depends(get_current_user)):
     month_start = date.today().replace(day=1)
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         goal = s.exec(
             select(BudgetGoal).where(
                 BudgetGoal.user_id == user.id,
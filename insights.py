@@ -7,7 +7,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
 from sqlmodel import Session, select, func
 from pydantic import BaseModel
 
-from database import engine
+from database import get_engine
 from auth import get_current_user
 from dbmodels import (
     User, Insight, InsightType, InsightPriority, Notification, NotificationType,
@@ -71,7 +71,7 @@ def generate_user_insights_task(user_id: int):
     generator = InsightsGenerator(user_id)
     insights = generator.generate_all_insights()
     
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Remove old insights (older than 30 days)
         old_date = datetime.utcnow() - timedelta(days=30)
         old_insights = session.exec(
@@ -116,7 +116,7 @@ def get_insights(
     user: UserSchema = Depends(get_current_user)
 ):
     """Get user's insights with optional filtering"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         query = select(Insight).where(
             Insight.user_id == user.id,
             Insight.is_dismissed == False
@@ -155,7 +155,7 @@ def mark_insight_read(
     user: UserSchema = Depends(get_current_user)
 ):
     """Mark an insight as read"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         insight = session.exec(
             select(Insight).where(
                 Insight.id == insight_id,
@@ -179,7 +179,7 @@ def dismiss_insight(
     user: UserSchema = Depends(get_current_user)
 ):
     """Dismiss an insight"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         insight = session.exec(
             select(Insight).where(
                 Insight.id == insight_id,
@@ -200,7 +200,7 @@ def dismiss_insight(
 @router.get("/insights/health-score", response_model=HealthScoreResponse)
 def get_health_score(user: UserSchema = Depends(get_current_user)):
     """Get user's financial health score"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get latest health score
         health_score = session.exec(
             select(FinancialHealthScore).where(
@@ -242,7 +242,7 @@ def get_health_score(user: UserSchema = Depends(get_current_user)):
 @router.get("/insights/preferences")
 def get_preferences(user: UserSchema = Depends(get_current_user)):
     """Get user's notification preferences"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         prefs = session.exec(
             select(UserPreferences).where(
                 UserPreferences.user_id == user.id
@@ -264,7 +264,7 @@ def update_preferences(
     user: UserSchema = Depends(get_current_user)
 ):
     """Update user's notification preferences"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         prefs = session.exec(
             select(UserPreferences).where(
                 UserPreferences.user_id == user.id
@@ -292,7 +292,7 @@ def calculate_what_if(
     user: UserSchema = Depends(get_current_user)
 ):
     """Calculate what-if scenarios for budget planning"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get last 30 days spending for the category
         start_date = date.today() - timedelta(days=30)
         
@@ -351,7 +351,7 @@ def calculate_what_if(
 @router.get("/insights/digest")
 def get_digest_preview(user: UserSchema = Depends(get_current_user)):
     """Get a preview of what would be in the email digest"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get recent insights
         recent_insights = session.exec(
             select(Insight).where(
@@ -410,7 +410,7 @@ def get_notifications(
     user: UserSchema = Depends(get_current_user)
 ):
     """Get user's notifications"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         query = select(Notification).where(
             Notification.user_id == user.id
         )
@@ -440,7 +440,7 @@ def send_test_digest(
             detail="Email service is not configured. Please set SMTP environment variables."
         )
     
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Get user with email
         db_user = session.exec(
             select(User).where(User.id == user.id)
@@ -467,14 +467,17 @@ def send_test_digest(
 @router.get("/insights/peer-comparison")
 def get_peer_comparison(user: UserSchema = Depends(get_current_user)):
     """Get user's spending compared to anonymized peer data"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         comparison_service = PeerComparisonService(session)
         
+        # Use one timestamp so both steps see the same 30-day window
+        now = datetime.now()
+        
         # Update benchmarks first (in production, this would be a scheduled job)
-        comparison_service.update_benchmarks()
+        comparison_service.update_benchmarks(now=now)
         
         # Get user comparison
-        comparison = comparison_service.get_user_comparison(user.id)
+        comparison = comparison_service.get_user_comparison(user.id, now=now)
         
         return comparison
 
@@ -482,7 +485,7 @@ def get_peer_comparison(user: UserSchema = Depends(get_current_user)):
 @router.get("/insights/savings-opportunities")
 def get_savings_opportunities(user: UserSchema = Depends(get_current_user)):
     """Get personalized savings opportunities based on peer comparison"""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         comparison_service = PeerComparisonService(session)
         opportunities = comparison_service.get_savings_opportunities(user.id)
         
@@ -8,7 +8,7 @@ import statistics
 from collections import defaultdict
 import numpy as np
 from sqlmodel import Session, select, func
-from database import engine
+from database import get_engine
 from dbmodels import (
     User, Tx, BudgetGoal, Insight, InsightType, InsightPriority,
     FinancialHealthScore, SpendingBenchmark
@@ -20,7 +20,7 @@ class AnomalyDetector:
     
     def __init__(self, user_id: int):
         self.user_id = user_id
-        self.session = Session(engine)
+        self.session = Session(get_engine())
         
     def detect_anomalies(self) -> List[Dict]:
         """Main method to detect all types of anomalies"""
@@ -216,7 +216,7 @@ class InsightsGenerator:
     
     def __init__(self, user_id: int):
         self.user_id = user_id
-        self.session = Session(engine)
+        self.session = Session(get_engine())
         self.anomaly_detector = AnomalyDetector(user_id)
         
     def generate_all_insights(self) -> List[Insight]:
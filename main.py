@@ -1,8 +1,7 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlmodel import SQLModel
+from fastapi.responses import FileResponse, ORJSONResponse, Response
 import logging
 import os
 import asyncio
@@ -17,7 +16,7 @@ except Exception:
                         k, v = line.strip().split("=", 1)
                         os.environ.setdefault(k, v)
 
-from database import engine
+from database import create_db_and_tables, should_create_tables
 from auth import router as auth_router
 from transactions import router as tx_router
 from forecast import router as forecast_router
@@ -35,7 +34,7 @@ if not os.getenv("JWT_SECRET"):
     logging.error("JWT_SECRET environment variable is required")
     raise ValueError("JWT_SECRET environment variable is required")
 
-app = FastAPI(title="CashBFF API", version="1.0.0")
+app = FastAPI(title="CashBFF API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Get allowed origins from environment or use defaults
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173,http://localhost:5174,http://localhost:8501").split(",")
@@ -75,10 +74,12 @@ app.add_middleware(
 )
 
 # Health check endpoint (must be before static file mounting)
+HEALTH_BODY = b'{"status":"healthy","service":"budgeteer-api"}'
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Railway"""
-    return {"status": "healthy", "service": "budgeteer-api"}
+    return Response(content=HEALTH_BODY, media_type="application/json")
 
 # Debug endpoint to check deployment
 @app.get("/debug")
@@ -119,10 +120,15 @@ app.include_router(recurring_router)
 
 @app.on_event("startup")
 async def startup_event() -> None:
-    SQLModel.metadata.create_all(engine)
+    if should_create_tables():
+        create_db_and_tables()
     # Scheduler disabled for now to simplify deployment
     logging.info("App started successfully")
 
+# API paths the React catch-all must never swallow
+RESERVED_PREFIXES = ("api/", "auth/", "tx", "goal", "forecast", "analytics", "insights")
+RESERVED_PATHS = frozenset({"docs", "redoc", "openapi.json", "health"})
+
 # Serve React static files (must be after API routes)
 static_dir = os.path.join(os.path.dirname(__file__), "static")
 logging.info(f"Looking for static files in: {static_dir}")
@@ -165,14 +171,7 @@ if os.path.exists(static_dir):
     async def serve_react(full_path: str):
         """Serve React app for all non-API routes"""
         # Skip API routes and docs
-        if (full_path.startswith("api/") or 
-            full_path.startswith("auth/") or
-            full_path.startswith("tx") or
-            full_path.startswith("goal") or
-            full_path.startswith("forecast") or
-            full_path.startswith("analytics") or
-            full_path.startswith("insights") or
-            full_path in ["docs", "redoc", "openapi.json", "health"]):
+        if full_path in RESERVED_PATHS or full_path.startswith(RESERVED_PREFIXES):
             raise HTTPException(status_code=404, detail="Not found")
         
         # Check if it's a static file request
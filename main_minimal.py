@@ -1,11 +1,10 @@
 """
 Minimal FastAPI app for Railway deployment
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from sqlmodel import SQLModel
+from fastapi.responses import ORJSONResponse, Response
 import logging
 import os
 from datetime import datetime
@@ -31,7 +30,7 @@ if not JWT_SECRET:
     logger.warning(f"Generated temporary JWT_SECRET: {JWT_SECRET[:8]}...")
 
 # Import after env vars are set
-from database import engine
+from database import create_db_and_tables, should_create_tables
 from auth import router as auth_router
 from transactions import router as transactions_router
 from forecast import router as forecast_router
@@ -44,7 +43,8 @@ from budgets import router as budgets_router
 app = FastAPI(
     title="CashBFF API",
     version="1.0.0",
-    description="Budget tracking API for students"
+    description="Budget tracking API for students",
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS
@@ -68,18 +68,52 @@ app.include_router(recurring_router)
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
+    if not should_create_tables():
+        logger.info("Skipping table creation (RUN_MIGRATIONS=0)")
+        return
     logger.info("Creating database tables...")
-    SQLModel.metadata.create_all(engine)
+    create_db_and_tables()
     logger.info("Database initialized successfully")
 
+# Pre-rendered health body; only the timestamp changes between calls
+HEALTH_TEMPLATE = b'{"status":"healthy","timestamp":"%s","version":"1.0.0"}'
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint for Railway"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": "1.0.0"
-    }
+    return Response(
+        content=HEALTH_TEMPLATE % datetime.utcnow().isoformat().encode(),
+        media_type="application/json"
+    )
+
+class CachedStaticFiles(StaticFiles):
+    """Static files for Vite's content-hashed bundles, which never change in place"""
+    
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return response
+
+def load_index(index_path: str):
+    """Read index.html and derive its weak ETag once at startup"""
+    stat = os.stat(index_path)
+    with open(index_path, "rb") as f:
+        body = f.read()
+    return body, f'W/"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+
+def index_response(request: Request, body: bytes, etag: str) -> Response:
+    """Serve the preloaded index.html, answering revalidation with a 304"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="text/html", headers=headers)
+
+# API paths the SPA catch-all must never swallow
+RESERVED_PREFIXES = (
+    "api/", "auth/", "tx", "goal", "forecast", "analytics", "insights",
+    "budgets", "recurring", "bills", "savings", "reminders"
+)
+RESERVED_PATHS = frozenset({"docs", "redoc", "openapi.json", "health", "login", "register", "me"})
 
 # Serve static files
 static_dir = os.path.join(os.path.dirname(__file__), "static")
@@ -94,39 +128,33 @@ if os.path.exists(static_dir):
     # Mount assets directory
     assets_dir = os.path.join(static_dir, "assets")
     if os.path.exists(assets_dir):
-        app.mount("/assets", StaticFiles(directory=assets_dir), name="assets")
+        app.mount("/assets", CachedStaticFiles(directory=assets_dir), name="assets")
         logger.info(f"Mounted assets directory: {assets_dir}")
     
+    # index.html only changes on deploy, so stat and read it once
+    index_path = os.path.join(static_dir, "index.html")
+    if os.path.exists(index_path):
+        index_body, index_etag = load_index(index_path)
+    else:
+        index_body, index_etag = None, None
+        logger.warning(f"index.html not found at: {index_path}")
+    
     # Serve index.html for root and all unmatched routes
     @app.get("/")
-    async def serve_root():
-        index_path = os.path.join(static_dir, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
+    async def serve_root(request: Request):
+        if index_body is not None:
+            return index_response(request, index_body, index_etag)
         return {"message": "CashBFF API", "docs": "/docs", "health": "/health"}
     
     # Catch-all route for React Router
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
+    async def serve_spa(full_path: str, request: Request):
         # Don't catch API routes
-        if (full_path.startswith("api/") or 
-            full_path.startswith("auth/") or
-            full_path.startswith("tx") or
-            full_path.startswith("goal") or
-            full_path.startswith("forecast") or
-            full_path.startswith("analytics") or
-            full_path.startswith("insights") or
-            full_path.startswith("budgets") or
-            full_path.startswith("recurring") or
-            full_path.startswith("bills") or
-            full_path.startswith("savings") or
-            full_path.startswith("reminders") or
-            full_path in ["docs", "redoc", "openapi.json", "health", "login", "register", "me"]):
+        if full_path in RESERVED_PATHS or full_path.startswith(RESERVED_PREFIXES):
             raise HTTPException(status_code=404, detail="Not found")
         
-        index_path = os.path.join(static_dir, "index.html")
-        if os.path.exists(index_path):
-            return FileResponse(index_path)
+        if index_body is not None:
+            return index_response(request, index_body, index_etag)
         raise HTTPException(status_code=404, detail="Not found")
 else:
     logger.warning(f"Static directory not found: {static_dir}")
@@ -144,4 +172,13 @@ else:
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+    uvicorn.run(
+        "main_minimal:app",
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        access_log=False
+    )
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Create database tables once at deploy time, before the web workers start
+"""
+import logging
+
+from sqlalchemy import DateTime, inspect, text
+
+from database import create_db_and_tables
+
+logger = logging.getLogger(__name__)
+
+
+def _add_missing_columns(engine) -> None:
+    """Add columns introduced after a table was first created
+
+    ``create_all`` only creates missing tables, so existing databases need
+    new nullable columns added by hand; each step is skipped once applied.
+    """
+    inspector = inspect(engine)
+    if "userpreferences" not in inspector.get_table_names():
+        return
+    columns = {column["name"] for column in inspector.get_columns("userpreferences")}
+    if "last_digest_sent_at" not in columns:
+        column_type = DateTime().compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE userpreferences ADD COLUMN last_digest_sent_at {column_type}"
+            ))
+        logger.info("Added userpreferences.last_digest_sent_at")
+
+
+def _add_benchmark_unique_index(engine) -> None:
+    """Unique (category, user_demographic) on spendingbenchmark
+
+    The benchmark upsert's ON CONFLICT needs it; older tables were created
+    without the constraint, so keep the newest row of any duplicates first.
+    """
+    inspector = inspect(engine)
+    if "spendingbenchmark" not in inspector.get_table_names():
+        return
+    key = {"category", "user_demographic"}
+    unique_sets = [
+        set(c["column_names"]) for c in inspector.get_unique_constraints("spendingbenchmark")
+    ] + [
+        set(i["column_names"]) for i in inspector.get_indexes("spendingbenchmark") if i["unique"]
+    ]
+    if key in unique_sets:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM spendingbenchmark WHERE id NOT IN ("
+            "SELECT MAX(id) FROM spendingbenchmark GROUP BY category, user_demographic)"
+        ))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_spendingbenchmark_category_demographic "
+            "ON spendingbenchmark (category, user_demographic)"
+        ))
+    logger.info("Added unique index on spendingbenchmark (category, user_demographic)")
+
+
+def _add_missing_indexes(engine) -> None:
+    """Create model indexes that existing tables were created without"""
+    from sqlmodel import SQLModel
+
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name in tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+
+
+def upgrade_schema(engine) -> None:
+    """Bring tables created by older releases up to the current models"""
+    _add_missing_columns(engine)
+    _add_benchmark_unique_index(engine)
+    _add_missing_indexes(engine)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    logging.info("Database tables are up to date")
@@ -1,25 +1,115 @@
-import pandas as pd
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+# Fitted models keyed by model kind and a fingerprint of their training data,
+# so a forecast for a different horizon on unchanged data skips the re-fit.
+# Entries pair each model with a lock serializing its predict calls, since
+# forecast routes run in FastAPI's threadpool.
+_FITTED_MODELS: "OrderedDict[tuple, tuple]" = OrderedDict()
+_FITTED_CACHE_SIZE = 32
+_FITTED_MODELS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _catboost_regressor():
+    """Import CatBoostRegressor on first use only."""
+    from catboost import CatBoostRegressor
+
+    return CatBoostRegressor
+
+
+@lru_cache(maxsize=1)
+def _neuralprophet():
+    """Import NeuralProphet (and torch) on first use only."""
+    from neuralprophet import NeuralProphet
+
+    return NeuralProphet
+
+
+def _fingerprint(*arrays) -> str:
+    """Cheap digest of the raw bytes of one or more arrays."""
+    h = hashlib.blake2b(digest_size=8)
+    for arr in arrays:
+        h.update(arr.tobytes())
+    return h.hexdigest()
+
+
+def _as_feature_matrix(values) -> np.ndarray:
+    """2-D float32 Fortran-ordered view of ``values``, CatBoost's zero-copy layout."""
+    arr = np.asarray(values, dtype=np.float32)
+    if arr.ndim == 1:
+        arr = arr.reshape(-1, 1)
+    return np.asfortranarray(arr)
+
+
+def _get_or_fit(key: tuple, fit):
+    """Return ``(model, predict_lock)`` for ``key``, fitting and storing it on a miss.
+
+    Fitting happens outside the cache lock so a slow fit doesn't block
+    lookups; if two threads race on the same key the first stored entry wins.
+    """
+    with _FITTED_MODELS_LOCK:
+        entry = _FITTED_MODELS.get(key)
+        if entry is not None:
+            _FITTED_MODELS.move_to_end(key)
+            return entry
+
+    model = fit()
+
+    with _FITTED_MODELS_LOCK:
+        entry = _FITTED_MODELS.get(key)
+        if entry is None:
+            entry = (model, threading.Lock())
+            _FITTED_MODELS[key] = entry
+            if len(_FITTED_MODELS) > _FITTED_CACHE_SIZE:
+                _FITTED_MODELS.popitem(last=False)
+        else:
+            _FITTED_MODELS.move_to_end(key)
+        return entry
 
 
 def catboost_predict(idx, running_values, future_idx):
     """Train a CatBoost regressor and predict future balances."""
-    from catboost import CatBoostRegressor  # lazy import
+    CatBoostRegressor = _catboost_regressor()
+
+    # CatBoost copies anything that is not float32 / F-ordered into that layout
+    idx = _as_feature_matrix(idx)
+    future_idx = _as_feature_matrix(future_idx)
+    running_values = np.ascontiguousarray(running_values, dtype=np.float32)
+
+    def fit():
+        model = CatBoostRegressor(iterations=200, thread_count=-1, verbose=False)
+        model.fit(idx, running_values)
+        return model
 
-    model = CatBoostRegressor(iterations=200, verbose=False)
-    model.fit(idx, running_values)
-    preds = model.predict(future_idx)
+    key = ("catboost", _fingerprint(idx, running_values))
+    model, predict_lock = _get_or_fit(key, fit)
+    with predict_lock:
+        preds = model.predict(future_idx, thread_count=-1)
     return preds
 
 
 def neuralprophet_predict(running_series, future_dates):
     """Forecast running balance using NeuralProphet."""
-    from neuralprophet import NeuralProphet  # lazy import
+    NeuralProphet = _neuralprophet()
 
     df = running_series.reset_index()
     df.columns = ["ds", "y"]
-    m = NeuralProphet()
-    m.fit(df, freq="D", progress="none")
-    future = m.make_future_dataframe(df, periods=len(future_dates))
-    forecast = m.predict(future)
+
+    def fit():
+        model = NeuralProphet()
+        model.fit(df, freq="D", progress="none")
+        return model
+
+    key = ("neuralprophet", _fingerprint(running_series.index.values, running_series.values))
+    m, predict_lock = _get_or_fit(key, fit)
+    # NeuralProphet keeps per-call state on the model, so one predict at a time
+    with predict_lock:
+        future = m.make_future_dataframe(df, periods=len(future_dates))
+        forecast = m.predict(future)
     preds = forecast["yhat1"].tail(len(future_dates)).values
     return preds
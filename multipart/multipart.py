@@ -42,26 +42,32 @@ class QuerystringParser:
         self.buffer.extend(data)
 
     def finalize(self) -> None:
-        body = self.buffer.decode()
-        first = True
-        for pair in body.split("&") if body else []:
-            if first:
-                first = False
-            self.callbacks.get("on_field_start", lambda: None)()
-            if "=" in pair:
-                name, value = pair.split("=", 1)
-            else:
-                name, value = pair, ""
-            cb_name = self.callbacks.get("on_field_name")
-            if cb_name:
-                b = name.encode()
-                cb_name(b, 0, len(b))
-            cb_data = self.callbacks.get("on_field_data")
-            if cb_data:
-                b = value.encode()
-                cb_data(b, 0, len(b))
-            if self.callbacks.get("on_field_end"):
-                self.callbacks["on_field_end"]()
+        # Field bytes are handed over still percent-encoded (Starlette
+        # unquotes them itself), so the body is split in place and callbacks
+        # receive offsets into the shared buffer rather than fresh copies.
+        data = self.buffer
+        on_field_start = self.callbacks.get("on_field_start")
+        on_field_name = self.callbacks.get("on_field_name")
+        on_field_data = self.callbacks.get("on_field_data")
+        on_field_end = self.callbacks.get("on_field_end")
+        length = len(data)
+        start = 0
+        while start < length:
+            end = data.find(b"&", start)
+            if end == -1:
+                end = length
+            if end > start:
+                eq = data.find(b"=", start, end)
+                name_end = end if eq == -1 else eq
+                value_start = end if eq == -1 else eq + 1
+                if on_field_start:
+                    on_field_start()
+                if on_field_name:
+                    on_field_name(data, start, name_end)
+                if on_field_data:
+                    on_field_data(data, value_start, end)
+                if on_field_end:
+                    on_field_end()
+            start = end + 1
         if self.callbacks.get("on_end"):
             self.callbacks["on_end"]()
-
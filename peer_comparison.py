@@ -1,32 +1,57 @@
 """
 Peer comparison service for anonymized spending benchmarks
 """
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+from datetime import date, datetime, timedelta
+from collections import defaultdict
+from operator import itemgetter
 from sqlmodel import Session, select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+import numpy as np
 from dbmodels import User, Tx, SpendingBenchmark
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Minimum number of users behind any benchmark, for anonymity
+MIN_PEERS = 5
+
+# Percentile ranks matching the stored benchmark breakpoints (min, p10 ... p90, max)
+PERCENTILE_MARKS = [0, 10, 25, 50, 75, 90, 100]
+
 
 class PeerComparisonService:
-    """Service for comparing user spending against anonymized peer data"""
+    """Service for comparing user spending against anonymized peer data
+    
+    Uses a synchronous Session; call it from plain ``def`` routes so FastAPI
+    runs it in the threadpool rather than on the event loop.
+    """
     
     def __init__(self, session: Session):
         self.session = session
     
-    def update_benchmarks(self, demographic: str = "all_users"):
+    @staticmethod
+    def _window(now: Optional[datetime] = None) -> Tuple[date, date]:
+        """Last-30-days date range ending at ``now``
+        
+        Both bounds are inclusive. The upper bound stays in the query because
+        recurring series store their projected future transactions alongside
+        past ones.
+        """
+        end_date = (now or datetime.now()).date()
+        return end_date - timedelta(days=29), end_date
+    
+    def update_benchmarks(self, demographic: str = "all_users", now: Optional[datetime] = None):
         """Update spending benchmarks for a demographic group"""
         try:
             # Get date range (last 30 days)
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
+            start_date, end_date = self._window(now)
             
             # Get all active users
             users = self.session.exec(select(User)).all()
             
-            if len(users) < 5:  # Need minimum users for anonymity
+            if len(users) < MIN_PEERS:  # Need minimum users for anonymity
                 logger.info("Not enough users for peer comparison")
                 return
             
@@ -36,75 +61,81 @@ class PeerComparisonService:
                 "education", "utilities", "health", "personal"
             ]
             
-            for category in categories:
-                # Get spending data for this category across all users
-                spending_data = self.session.exec(
-                    select(
-                        Tx.user_id,
-                        func.sum(func.abs(Tx.amount)).label("total")
-                    ).where(
-                        Tx.tx_date >= start_date,
-                        Tx.tx_date <= end_date,
-                        Tx.label == category,
-                        Tx.amount < 0
-                    ).group_by(Tx.user_id)
-                ).all()
-                
-                if not spending_data:
-                    continue
-                
+            # Per-user totals for every category in one query; HAVING drops empty
+            # totals and the window count drops categories with too few peers
+            total = func.sum(func.abs(Tx.amount))
+            per_user = select(
+                Tx.user_id,
+                Tx.label,
+                total.label("total"),
+                func.count().over(partition_by=Tx.label).label("peer_count")
+            ).where(
+                Tx.tx_date.between(start_date, end_date),
+                Tx.label.in_(categories),
+                Tx.amount < 0
+            ).group_by(Tx.user_id, Tx.label).having(total > 0).subquery()
+            
+            spending_data = self.session.exec(
+                select(per_user.c.label, per_user.c.total).where(
+                    per_user.c.peer_count >= MIN_PEERS
+                )
+            ).all()
+            
+            # Bucket per-user totals by category
+            totals_by_category: Dict[str, List[float]] = defaultdict(list)
+            for category, total in spending_data:
+                totals_by_category[category].append(total)
+            
+            updated_at = datetime.utcnow()
+            benchmark_rows = []
+            
+            for category, totals in totals_by_category.items():
                 # Calculate statistics
-                amounts = [data.total for _, data in spending_data if data.total]
-                if len(amounts) < 5:  # Need minimum data points
-                    continue
-                
-                amounts.sort()
-                count = len(amounts)
+                amounts = np.fromiter(totals, dtype=np.float64, count=len(totals))
                 
-                # Calculate percentiles
-                p10_idx = int(count * 0.1)
-                p25_idx = int(count * 0.25)
-                p50_idx = int(count * 0.5)
-                p75_idx = int(count * 0.75)
-                p90_idx = int(count * 0.9)
+                # Calculate percentiles in a single vectorized pass
+                p10, p25, p50, p75, p90 = np.percentile(amounts, [10, 25, 50, 75, 90])
                 
                 benchmark_data = {
-                    "mean": sum(amounts) / count,
-                    "median": amounts[p50_idx],
-                    "p10": amounts[p10_idx],
-                    "p25": amounts[p25_idx],
-                    "p75": amounts[p75_idx],
-                    "p90": amounts[p90_idx],
-                    "min": amounts[0],
-                    "max": amounts[-1],
-                    "user_count": count
+                    "mean": float(amounts.mean()),
+                    "median": float(p50),
+                    "p10": float(p10),
+                    "p25": float(p25),
+                    "p75": float(p75),
+                    "p90": float(p90),
+                    "min": float(amounts.min()),
+                    "max": float(amounts.max()),
+                    "user_count": int(amounts.size),
+                    "breakpoints": [
+                        float(amounts.min()), float(p10), float(p25), float(p50),
+                        float(p75), float(p90), float(amounts.max())
+                    ],
+                    "pct_marks": PERCENTILE_MARKS
                 }
                 
-                # Check if benchmark exists
-                existing = self.session.exec(
-                    select(SpendingBenchmark).where(
-                        SpendingBenchmark.category == category,
-                        SpendingBenchmark.user_demographic == demographic
-                    )
-                ).first()
-                
-                if existing:
-                    # Update existing benchmark
-                    existing.average_percentage = benchmark_data["mean"] / 1000 * 100  # Rough estimate
-                    existing.median_amount = benchmark_data["median"]
-                    existing.benchmark_data = benchmark_data
-                    existing.updated_at = datetime.utcnow()
-                else:
-                    # Create new benchmark
-                    benchmark = SpendingBenchmark(
-                        category=category,
-                        user_demographic=demographic,
-                        average_percentage=benchmark_data["mean"] / 1000 * 100,  # Rough estimate
-                        median_amount=benchmark_data["median"],
-                        benchmark_data=benchmark_data,
-                        updated_at=datetime.utcnow()
-                    )
-                    self.session.add(benchmark)
+                benchmark_rows.append({
+                    "category": category,
+                    "user_demographic": demographic,
+                    "average_percentage": benchmark_data["mean"] / 1000 * 100,  # Rough estimate
+                    "median_amount": benchmark_data["median"],
+                    "benchmark_data": benchmark_data,
+                    "updated_at": updated_at
+                })
+            
+            if benchmark_rows:
+                # Insert or refresh every category's benchmark in one statement
+                # The app runs on either SQLite or Postgres
+                dialect = self.session.get_bind().dialect.name
+                upsert = sqlite_insert if dialect == "sqlite" else pg_insert
+                stmt = upsert(SpendingBenchmark).values(benchmark_rows)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=["category", "user_demographic"],
+                    set_={
+                        column: stmt.excluded[column]
+                        for column in ("average_percentage", "median_amount", "benchmark_data", "updated_at")
+                    }
+                )
+                self.session.execute(stmt)
             
             self.session.commit()
             logger.info(f"Updated benchmarks for {demographic}")
@@ -113,12 +144,11 @@ class PeerComparisonService:
             logger.error(f"Failed to update benchmarks: {str(e)}")
             self.session.rollback()
     
-    def get_user_comparison(self, user_id: int) -> Dict:
+    def get_user_comparison(self, user_id: int, now: Optional[datetime] = None) -> Dict:
         """Get user's spending compared to peers"""
         try:
             # Get user's spending by category (last 30 days)
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
+            start_date, end_date = self._window(now)
             
             user_spending = self.session.exec(
                 select(
@@ -126,26 +156,30 @@ class PeerComparisonService:
                     func.sum(func.abs(Tx.amount)).label("total")
                 ).where(
                     Tx.user_id == user_id,
-                    Tx.tx_date >= start_date,
-                    Tx.tx_date <= end_date,
+                    Tx.tx_date.between(start_date, end_date),
                     Tx.amount < 0
                 ).group_by(Tx.label)
             ).all()
             
+            # Get benchmarks for all of the user's categories in one query
+            categories = [category for category, _ in user_spending if category]
+            benchmarks = {
+                b.category: b
+                for b in self.session.exec(
+                    select(SpendingBenchmark).where(
+                        SpendingBenchmark.category.in_(categories),
+                        SpendingBenchmark.user_demographic == "all_users"
+                    )
+                ).all()
+            } if categories else {}
+            
             comparisons = []
             
             for category, amount in user_spending:
                 if not category:
                     continue
                 
-                # Get benchmark for this category
-                benchmark = self.session.exec(
-                    select(SpendingBenchmark).where(
-                        SpendingBenchmark.category == category,
-                        SpendingBenchmark.user_demographic == "all_users"
-                    )
-                ).first()
-                
+                benchmark = benchmarks.get(category)
                 if not benchmark:
                     continue
                 
@@ -207,39 +241,40 @@ class PeerComparisonService:
             }
     
     def _calculate_percentile(self, value: float, benchmark_data: Dict) -> float:
-        """Calculate percentile rank for a value"""
-        if value <= benchmark_data["p10"]:
-            return 10
-        elif value <= benchmark_data["p25"]:
-            return 25
-        elif value <= benchmark_data["median"]:
-            return 50
-        elif value <= benchmark_data["p75"]:
-            return 75
-        elif value <= benchmark_data["p90"]:
-            return 90
-        else:
-            return 95
+        """Calculate percentile rank for a value by interpolating between breakpoints"""
+        breakpoints = benchmark_data.get("breakpoints") or [
+            benchmark_data["min"], benchmark_data["p10"], benchmark_data["p25"],
+            benchmark_data["median"], benchmark_data["p75"], benchmark_data["p90"],
+            benchmark_data["max"]
+        ]
+        marks = benchmark_data.get("pct_marks", PERCENTILE_MARKS)
+        return float(np.interp(value, breakpoints, marks))
     
     def get_savings_opportunities(self, user_id: int) -> List[Dict]:
         """Identify categories where user could save based on peer data"""
-        comparison = self.get_user_comparison(user_id)
-        opportunities = []
+        comparisons = self.get_user_comparison(user_id).get("comparisons")
+        if not comparisons:
+            return []
         
-        for comp in comparison.get("comparisons", []):
-            if comp["status"] == "high":
-                potential_savings = comp["user_amount"] - comp["peer_median"]
-                opportunities.append({
-                    "category": comp["category"],
-                    "current_spending": comp["user_amount"],
-                    "peer_median": comp["peer_median"],
-                    "potential_monthly_savings": potential_savings,
-                    "potential_annual_savings": potential_savings * 12,
-                    "recommendation": f"Try to reduce {comp['category']} spending by "
-                                    f"${potential_savings:.0f}/month to match typical peers"
-                })
+        opportunities = [
+            {
+                "category": comp["category"],
+                "current_spending": comp["user_amount"],
+                "peer_median": comp["peer_median"],
+                "potential_monthly_savings": comp["user_amount"] - comp["peer_median"]
+            }
+            for comp in comparisons
+            if comp["status"] == "high"
+        ]
         
-        # Sort by potential savings
-        opportunities.sort(key=lambda x: x["potential_monthly_savings"], reverse=True)
+        # Sort by potential savings, then fill in the derived fields
+        opportunities.sort(key=itemgetter("potential_monthly_savings"), reverse=True)
+        for opp in opportunities:
+            savings = opp["potential_monthly_savings"]
+            opp["potential_annual_savings"] = savings * 12
+            opp["recommendation"] = (
+                f"Try to reduce {opp['category']} spending by "
+                f"${savings:.0f}/month to match typical peers"
+            )
         
-        return opportunities
\ No newline at end of file
+        return opportunities
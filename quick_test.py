@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 """Quick test to verify Budgeteer is working"""
+import asyncio
+import httpx
 import requests
 import json
 from datetime import date, timedelta
@@ -52,8 +54,13 @@ transactions = [
     {"tx_date": str(date.today() - timedelta(days=5)), "amount": -300, "label": "Entertainment"},  # Anomaly
 ]
 
-for tx in transactions:
-    response = requests.post(f"{BASE_URL}/tx", json=tx, headers=headers)
+async def add_transactions(transactions):
+    """Post all transactions concurrently over one keep-alive pool"""
+    limits = httpx.Limits(max_keepalive_connections=5, max_connections=10)
+    async with httpx.AsyncClient(base_url=BASE_URL, headers=headers, limits=limits) as client:
+        return await asyncio.gather(*(client.post("/tx", json=tx) for tx in transactions))
+
+for tx, response in zip(transactions, asyncio.run(add_transactions(transactions))):
     if response.status_code == 200:
         print(f"  ✅ Added: {tx['label']} - ${abs(tx['amount'])}")
     else:
@@ -4,14 +4,18 @@ Recurring expenses API endpoints
 from datetime import datetime, date, timedelta
 from typing import List, Optional, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select, func, and_, or_
+from fastapi.responses import ORJSONResponse
+from sqlmodel import Session, select, func, and_, or_, case, delete, insert
 from pydantic import BaseModel
-from database import engine
+from database import get_engine
 from auth import get_current_user
 from dbmodels import User, Tx
-import pandas as pd
+from dateutil.relativedelta import relativedelta
+from bisect import bisect_left
+from collections import defaultdict
+import re
 
-router = APIRouter(prefix="/recurring", tags=["recurring"])
+router = APIRouter(prefix="/recurring", tags=["recurring"], default_response_class=ORJSONResponse)
 
 class RecurringExpenseResponse(BaseModel):
     id: int
@@ -33,151 +37,177 @@ class RecurringStats(BaseModel):
     upcoming_week: List[RecurringExpenseResponse]
     by_category: Dict[str, float]
 
-def get_frequency_from_series(transactions: List[Tx]) -> str:
-    """Determine frequency from transaction series"""
-    if len(transactions) < 2:
-        return "monthly"  # Default
+# Upper bounds (inclusive) on the average gap in days for each frequency
+_FREQUENCY_GAP_LIMITS = (1.5, 10, 20, 45, 120)
+_FREQUENCIES = ("daily", "weekly", "biweekly", "monthly", "quarterly", "yearly")
+
+# Factor converting one payment at each frequency into a monthly amount
+_FREQ_TO_MONTHLY = {
+    "daily": 30.0,
+    "weekly": 4.33,
+    "biweekly": 2.17,
+    "monthly": 1.0,
+    "quarterly": 1 / 3,
+    "yearly": 1 / 12,
+}
+
+_CATEGORY_STRIP_RE = re.compile(r" & | ")
+
+def normalize_category(label: str) -> str:
+    """Lowercase a label and drop its spaces and ampersands"""
+    return _CATEGORY_STRIP_RE.sub("", label.lower())
+
+def frequency_from_average_gap(avg_days: float) -> str:
+    """Map the average number of days between payments to a frequency"""
+    return _FREQUENCIES[bisect_left(_FREQUENCY_GAP_LIMITS, avg_days)]
+
+def frequency_from_span(first_date: date, last_date: date, distinct_dates: int) -> str:
+    """Frequency from series aggregates
     
-    # Calculate average days between transactions
-    sorted_txs = sorted(transactions, key=lambda x: x.tx_date)
-    total_days = 0
-    count = 0
+    Same-day entries are ignored, so the positive gaps between sorted dates
+    always sum to the full span and number one less than the distinct dates.
+    """
+    if distinct_dates < 2:
+        return "monthly"
+    return frequency_from_average_gap((last_date - first_date).days / (distinct_dates - 1))
+
+def _series_filter(user_id: int):
+    """WHERE clause matching every recurring transaction of a user"""
+    return and_(
+        Tx.user_id == user_id,
+        Tx.recurring == True,
+        Tx.series_id != None
+    )
+
+def _compute_recurring_expenses(
+    session: Session, user_id: int, today: date, active_only: bool = False
+) -> List[RecurringExpenseResponse]:
+    """Build the recurring expense list for a user on an open session
     
-    for i in range(1, len(sorted_txs)):
-        days_diff = (sorted_txs[i].tx_date - sorted_txs[i-1].tx_date).days
-        if days_diff > 0:  # Ignore same-day transactions
-            total_days += days_diff
-            count += 1
+    With ``active_only`` the series without upcoming payments are dropped
+    in SQL rather than after building their responses.
+    """
+    series_filter = _series_filter(user_id)
     
-    if count == 0:
-        return "monthly"
+    # One row per series with its date range and next upcoming date
+    spans = select(
+        Tx.series_id,
+        func.min(Tx.tx_date).label("first_date"),
+        func.max(Tx.tx_date).label("last_date"),
+        func.count(func.distinct(Tx.tx_date)).label("distinct_dates"),
+        func.min(case((Tx.tx_date >= today, Tx.tx_date))).label("next_date")
+    ).where(series_filter).group_by(Tx.series_id)
+    if active_only:
+        spans = spans.having(func.max(Tx.tx_date) >= today)
+    spans = spans.subquery()
     
-    avg_days = total_days / count
+    # Details of the most recent transaction in each series
+    ranked = select(
+        Tx.series_id,
+        Tx.amount,
+        Tx.label,
+        Tx.notes,
+        func.row_number().over(
+            partition_by=Tx.series_id,
+            order_by=(Tx.tx_date.desc(), Tx.id.desc())
+        ).label("rn")
+    ).where(series_filter).subquery()
     
-    # Determine frequency based on average days
-    if avg_days <= 1.5:
-        return "daily"
-    elif avg_days <= 10:
-        return "weekly"
-    elif avg_days <= 20:
-        return "biweekly"
-    elif avg_days <= 45:
-        return "monthly"
-    elif avg_days <= 120:
-        return "quarterly"
-    else:
-        return "yearly"
+    rows = session.exec(
+        select(
+            spans.c.series_id,
+            spans.c.first_date,
+            spans.c.last_date,
+            spans.c.distinct_dates,
+            spans.c.next_date,
+            ranked.c.amount,
+            ranked.c.label,
+            ranked.c.notes
+        ).join(
+            ranked,
+            and_(ranked.c.series_id == spans.c.series_id, ranked.c.rn == 1)
+        ).order_by(spans.c.series_id)
+    ).all()
+    
+    expenses = []
+    for row in rows:
+        # Use notes from latest transaction or generate name from label
+        name = row.notes if row.notes else row.label
+        
+        # Values come straight from typed DB columns, so skip validation
+        expenses.append(RecurringExpenseResponse.model_construct(
+            id=row.series_id,  # Use series_id as the expense ID
+            name=name,
+            amount=abs(row.amount),  # Make positive for display
+            category=normalize_category(row.label),
+            frequency=frequency_from_span(row.first_date, row.last_date, row.distinct_dates),
+            next_date=(row.next_date or row.last_date).isoformat(),
+            is_active=row.next_date is not None,  # Active while it has upcoming transactions
+            reminder_days=3,  # Default reminder
+            notes=row.notes,
+            series_id=row.series_id
+        ))
+    
+    return expenses
 
 @router.get("/expenses", response_model=List[RecurringExpenseResponse])
 def get_recurring_expenses(
     user: User = Depends(get_current_user)
 ):
     """Get all recurring expenses for the user"""
-    with Session(engine) as session:
-        # Get all recurring transactions grouped by series_id
-        recurring_txs = session.exec(
-            select(Tx).where(
-                Tx.user_id == user.id,
-                Tx.recurring == True,
-                Tx.series_id != None
-            ).order_by(Tx.series_id, Tx.tx_date)
-        ).all()
-        
-        # Group by series_id
-        series_map = {}
-        for tx in recurring_txs:
-            if tx.series_id not in series_map:
-                series_map[tx.series_id] = []
-            series_map[tx.series_id].append(tx)
-        
-        expenses = []
-        today = date.today()
-        
-        for series_id, txs in series_map.items():
-            if not txs:
-                continue
-            
-            # Get the most recent transaction for details
-            latest_tx = max(txs, key=lambda x: x.tx_date)
-            
-            # Find next upcoming transaction
-            future_txs = [tx for tx in txs if tx.tx_date >= today]
-            next_tx = min(future_txs, key=lambda x: x.tx_date) if future_txs else None
-            
-            # Determine if series is active (has future transactions)
-            is_active = len(future_txs) > 0
-            
-            # Use notes from latest transaction or generate name from label
-            name = latest_tx.notes if latest_tx.notes else latest_tx.label
-            
-            expenses.append(RecurringExpenseResponse(
-                id=series_id,  # Use series_id as the expense ID
-                name=name,
-                amount=abs(latest_tx.amount),  # Make positive for display
-                category=latest_tx.label.lower().replace(" & ", "").replace(" ", ""),
-                frequency=get_frequency_from_series(txs),
-                next_date=next_tx.tx_date.isoformat() if next_tx else latest_tx.tx_date.isoformat(),
-                is_active=is_active,
-                reminder_days=3,  # Default reminder
-                notes=latest_tx.notes,
-                series_id=series_id
-            ))
-        
-        return expenses
+    with Session(get_engine()) as session:
+        return _compute_recurring_expenses(session, user.id, date.today())
 
 @router.get("/stats", response_model=RecurringStats)
 def get_recurring_stats(
     user: User = Depends(get_current_user)
 ):
     """Get recurring expense statistics"""
-    expenses = get_recurring_expenses(user)
-    
-    # Calculate monthly amounts based on frequency
-    def to_monthly(expense: RecurringExpenseResponse) -> float:
-        if not expense.is_active:
-            return 0
-        amount = expense.amount
-        if expense.frequency == "daily":
-            return amount * 30
-        elif expense.frequency == "weekly":
-            return amount * 4.33
-        elif expense.frequency == "biweekly":
-            return amount * 2.17
-        elif expense.frequency == "monthly":
-            return amount
-        elif expense.frequency == "quarterly":
-            return amount / 3
-        elif expense.frequency == "yearly":
-            return amount / 12
-        return amount
-    
-    active_expenses = [e for e in expenses if e.is_active]
-    total_monthly = sum(to_monthly(e) for e in active_expenses)
-    
-    # Get upcoming week expenses
     today = date.today()
     week_from_now = today + timedelta(days=7)
-    upcoming = [
-        e for e in active_expenses 
-        if today <= date.fromisoformat(e.next_date) <= week_from_now
-    ]
     
-    # Calculate by category
-    by_category = {}
+    with Session(get_engine()) as session:
+        active_expenses = _compute_recurring_expenses(
+            session, user.id, today, active_only=True
+        )
+        
+        # Paused series: nothing scheduled from today on
+        paused_count = session.exec(
+            select(func.count()).select_from(
+                select(Tx.series_id).where(
+                    _series_filter(user.id)
+                ).group_by(Tx.series_id).having(
+                    func.max(Tx.tx_date) < today
+                ).subquery()
+            )
+        ).one()
+        
+        # Series with a payment in the next 7 days
+        upcoming_ids = set(session.exec(
+            select(Tx.series_id).where(
+                _series_filter(user.id),
+                Tx.tx_date.between(today, week_from_now)
+            ).distinct()
+        ).all())
+    
+    # Totals in a single pass over the active series
+    total_monthly = 0.0
+    by_category = defaultdict(float)
     for expense in active_expenses:
-        monthly_amount = to_monthly(expense)
-        if expense.category in by_category:
-            by_category[expense.category] += monthly_amount
-        else:
-            by_category[expense.category] = monthly_amount
+        monthly_amount = expense.amount * _FREQ_TO_MONTHLY.get(expense.frequency, 1.0)
+        total_monthly += monthly_amount
+        by_category[expense.category] += monthly_amount
+    
+    # Get upcoming week expenses
+    upcoming = [e for e in active_expenses if e.series_id in upcoming_ids]
     
     return RecurringStats(
         total_monthly=total_monthly,
         total_yearly=total_monthly * 12,
         active_count=len(active_expenses),
-        paused_count=len(expenses) - len(active_expenses),
+        paused_count=paused_count,
         upcoming_week=upcoming,
-        by_category=by_category
+        by_category=dict(by_category)
     )
 
 @router.patch("/expenses/{series_id}/toggle")
@@ -186,45 +216,47 @@ def toggle_recurring_expense(
     user: User = Depends(get_current_user)
 ):
     """Toggle a recurring expense series on/off"""
-    with Session(engine) as session:
-        # Get all transactions in this series
-        txs = session.exec(
-            select(Tx).where(
+    today = date.today()
+    
+    with Session(get_engine()) as session:
+        # Toggle by deleting or creating future transactions. If there are
+        # future transactions the series is active - deactivate it by removing them
+        removed = session.exec(
+            delete(Tx).where(
                 Tx.user_id == user.id,
-                Tx.series_id == series_id
+                Tx.series_id == series_id,
+                Tx.tx_date > today
             )
-        ).all()
-        
-        if not txs:
-            raise HTTPException(status_code=404, detail="Recurring expense not found")
-        
-        today = date.today()
-        
-        # Toggle by deleting or creating future transactions
-        future_txs = [tx for tx in txs if tx.tx_date > today]
+        ).rowcount
         
-        if future_txs:
-            # Currently active - deactivate by removing future transactions
-            for tx in future_txs:
-                session.delete(tx)
-        else:
+        if not removed:
             # Currently inactive - reactivate by creating future transactions
-            latest_tx = max(txs, key=lambda x: x.tx_date)
-            last_date = latest_tx.tx_date
+            latest_tx = session.exec(
+                select(Tx.tx_date, Tx.amount, Tx.label, Tx.notes).where(
+                    Tx.user_id == user.id,
+                    Tx.series_id == series_id
+                ).order_by(Tx.tx_date.desc()).limit(1)
+            ).first()
             
-            # Create 3 months of future transactions
-            for i in range(3):
-                last_date = (pd.Timestamp(last_date) + pd.DateOffset(months=1)).date()
-                new_tx = Tx(
-                    tx_date=last_date,
-                    amount=latest_tx.amount,
-                    label=latest_tx.label,
-                    notes=latest_tx.notes,
-                    recurring=True,
-                    series_id=series_id,
-                    user_id=user.id
-                )
-                session.add(new_tx)
+            if not latest_tx:
+                raise HTTPException(status_code=404, detail="Recurring expense not found")
+            
+            # Create 3 months of future transactions in one executemany INSERT
+            future_dates = [
+                latest_tx.tx_date + relativedelta(months=i) for i in range(1, 4)
+            ]
+            session.execute(insert(Tx), [
+                {
+                    "tx_date": tx_date,
+                    "amount": latest_tx.amount,
+                    "label": latest_tx.label,
+                    "notes": latest_tx.notes,
+                    "recurring": True,
+                    "series_id": series_id,
+                    "user_id": user.id
+                }
+                for tx_date in future_dates
+            ])
         
         session.commit()
         return {"status": "toggled"}
@@ -235,21 +267,16 @@ def delete_recurring_expense(
     user: User = Depends(get_current_user)
 ):
     """Delete all transactions in a recurring series"""
-    with Session(engine) as session:
-        # Get all transactions in this series
-        txs = session.exec(
-            select(Tx).where(
+    with Session(get_engine()) as session:
+        count = session.exec(
+            delete(Tx).where(
                 Tx.user_id == user.id,
                 Tx.series_id == series_id
             )
-        ).all()
+        ).rowcount
         
-        if not txs:
+        if not count:
             raise HTTPException(status_code=404, detail="Recurring expense not found")
         
-        # Delete all transactions in the series
-        for tx in txs:
-            session.delete(tx)
-        
         session.commit()
-        return {"status": "deleted", "count": len(txs)}
\ No newline at end of file
+        return {"status": "deleted", "count": count}
@@ -4,8 +4,10 @@ Background scheduler for periodic tasks like insight generation
 from datetime import datetime, timedelta
 import asyncio
 import logging
-from sqlmodel import Session, select
-from database import engine
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from sqlmodel import Session, select, or_
+from database import get_engine
 from dbmodels import User, UserPreferences
 try:
     from insights_engine import InsightsGenerator
@@ -18,6 +20,21 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Cron fields for each digest cadence (UTC): daily at 08:00, weekly on
+# Mondays and monthly on the 1st
+DIGEST_TRIGGERS = {
+    "daily": {"hour": 8, "minute": 0},
+    "weekly": {"day_of_week": "mon", "hour": 8, "minute": 0},
+    "monthly": {"day": 1, "hour": 8, "minute": 0},
+}
+
+# How long after a cadence run the hourly catch-up keeps retrying users that
+# were skipped for quiet hours
+DIGEST_CATCHUP_WINDOW = timedelta(days=1)
+
+# Users processed at once by the scheduled insight and digest runs
+INSIGHT_CONCURRENCY = 8
+
 
 class InsightScheduler:
     """Manages scheduled generation of insights"""
@@ -25,91 +42,153 @@ class InsightScheduler:
     def __init__(self):
         self.running = False
         self.email_service = EmailService()
+        self.scheduler = AsyncIOScheduler(timezone="UTC")
         
     async def start(self):
         """Start the scheduler"""
+        self.scheduler.add_job(
+            self.generate_scheduled_insights, CronTrigger(minute=0),
+            id="insights", replace_existing=True
+        )
+        for frequency, fields in DIGEST_TRIGGERS.items():
+            self.scheduler.add_job(
+                self.send_digest_emails, CronTrigger(**fields),
+                args=[frequency], id=f"digest_{frequency}", replace_existing=True
+            )
+        # Off the hour so it never overlaps the cadence runs above
+        self.scheduler.add_job(
+            self.send_catchup_digests, CronTrigger(minute=30),
+            id="digest_catchup", replace_existing=True
+        )
+        self.scheduler.start()
         self.running = True
         logger.info("Insight scheduler started")
-        
-        # Wait a bit before starting to let the app initialize
-        await asyncio.sleep(30)
-        
-        while self.running:
-            try:
-                await self.generate_scheduled_insights()
-                # Run every hour
-                await asyncio.sleep(3600)
-            except Exception as e:
-                logger.error(f"Error in scheduler: {e}")
-                await asyncio.sleep(60)  # Retry after 1 minute
     
     def stop(self):
         """Stop the scheduler"""
+        if self.running:
+            self.scheduler.shutdown(wait=False)
         self.running = False
         logger.info("Insight scheduler stopped")
     
     async def generate_scheduled_insights(self):
         """Generate insights for all users based on their preferences"""
-        with Session(engine) as session:
-            # Get all users
-            users = session.exec(select(User)).all()
-            
-            for user in users:
-                try:
-                    # Check user preferences
-                    prefs = session.exec(
-                        select(UserPreferences).where(
-                            UserPreferences.user_id == user.id
-                        )
-                    ).first()
-                    
-                    # Skip if user has disabled insights
-                    if prefs and prefs.email_digest_frequency == "never":
-                        continue
-                    
-                    # Generate insights
-                    logger.info(f"Generating insights for user {user.id}")
-                    generate_user_insights_task(user.id)
-                    
-                except Exception as e:
-                    logger.error(f"Error generating insights for user {user.id}: {e}")
+        with Session(get_engine()) as session:
+            # Users without preferences, or who haven't disabled insights
+            user_ids = session.exec(
+                select(User.id).outerjoin(
+                    UserPreferences, UserPreferences.user_id == User.id
+                ).where(
+                    or_(
+                        UserPreferences.id == None,
+                        UserPreferences.email_digest_frequency != "never"
+                    )
+                )
+            ).all()
+        
+        semaphore = asyncio.Semaphore(INSIGHT_CONCURRENCY)
+        
+        async def run_one(user_id: int):
+            async with semaphore:
+                logger.info(f"Generating insights for user {user_id}")
+                await asyncio.to_thread(generate_user_insights_task, user_id)
+        
+        # Users are independent, so overlap their (blocking) generation runs
+        results = await asyncio.gather(
+            *(run_one(user_id) for user_id in user_ids),
+            return_exceptions=True
+        )
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error generating insights for user {user_id}: {result}")
     
-    async def send_digest_emails(self):
-        """Send digest emails based on user preferences"""
-        current_time = datetime.utcnow()
-        current_hour = current_time.hour
-        current_day = current_time.weekday()  # 0 = Monday
+    @staticmethod
+    def _period_start(frequency: str, now: datetime) -> datetime:
+        """Most recent scheduled run of a digest cadence at or before ``now``"""
+        start = now.replace(hour=8, minute=0, second=0, microsecond=0)
+        if frequency == "weekly":
+            start -= timedelta(days=start.weekday())
+        elif frequency == "monthly":
+            start = start.replace(day=1)
         
-        with Session(engine) as session:
-            # Get users with email preferences
-            users_with_prefs = session.exec(
-                select(User, UserPreferences).join(UserPreferences)
+        if start > now:
+            if frequency == "daily":
+                start -= timedelta(days=1)
+            elif frequency == "weekly":
+                start -= timedelta(days=7)
+            else:
+                start = (start - timedelta(days=1)).replace(day=1)
+        return start
+    
+    async def send_catchup_digests(self):
+        """Retry digests for users skipped by a recent cadence run"""
+        now = datetime.utcnow()
+        for frequency in DIGEST_TRIGGERS:
+            if now - self._period_start(frequency, now) < DIGEST_CATCHUP_WINDOW:
+                await self.send_digest_emails(frequency)
+    
+    def _due_digest_users(self, frequency: str, period_start: datetime) -> list:
+        """Users on a cadence who haven't had a digest this period"""
+        with Session(get_engine()) as session:
+            return session.exec(
+                select(User.id, UserPreferences.quiet_hours_start,
+                       UserPreferences.quiet_hours_end,
+                       UserPreferences.notification_types)
+                .join(UserPreferences)
+                .where(
+                    UserPreferences.email_digest_frequency == frequency,
+                    or_(
+                        UserPreferences.last_digest_sent_at == None,
+                        UserPreferences.last_digest_sent_at < period_start
+                    )
+                )
             ).all()
-            
-            for user, prefs in users_with_prefs:
-                try:
-                    # Skip if outside quiet hours
-                    if prefs.quiet_hours_start and prefs.quiet_hours_end:
-                        if prefs.quiet_hours_start <= current_hour < prefs.quiet_hours_end:
-                            continue
-                    
-                    # Check frequency
-                    should_send = False
-                    
-                    if prefs.email_digest_frequency == "daily":
-                        should_send = True
-                    elif prefs.email_digest_frequency == "weekly" and current_day == 0:  # Monday
-                        should_send = True
-                    elif prefs.email_digest_frequency == "monthly" and current_time.day == 1:
-                        should_send = True
-                    
-                    if should_send and "email" in prefs.notification_types:
-                        # Send digest email
-                        logger.info(f"Sending {prefs.email_digest_frequency} digest to user {user.id}")
-                        self.email_service.send_digest(session, user, prefs.email_digest_frequency)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing digest for user {user.id}: {e}")
+    
+    def _send_user_digest(self, user_id: int, frequency: str, sent_at: datetime):
+        """Send one user's digest and record when it went out"""
+        with Session(get_engine()) as session:
+            user = session.get(User, user_id)
+            if not self.email_service.send_digest(session, user, frequency):
+                return
+            prefs = session.exec(
+                select(UserPreferences).where(UserPreferences.user_id == user_id)
+            ).first()
+            prefs.last_digest_sent_at = sent_at
+            session.add(prefs)
+            session.commit()
+    
+    async def send_digest_emails(self, frequency: str):
+        """Send digest emails to users on the given cadence"""
+        now = datetime.utcnow()
+        current_hour = now.hour
+        period_start = self._period_start(frequency, now)
+        
+        users = await asyncio.to_thread(self._due_digest_users, frequency, period_start)
+        
+        user_ids = []
+        for user_id, quiet_start, quiet_end, notification_types in users:
+            # Skip if outside quiet hours; the catch-up run retries them
+            if quiet_start and quiet_end:
+                if quiet_start <= current_hour < quiet_end:
+                    continue
+            if "email" in notification_types:
+                user_ids.append(user_id)
+        
+        semaphore = asyncio.Semaphore(INSIGHT_CONCURRENCY)
+        
+        async def run_one(user_id: int):
+            async with semaphore:
+                logger.info(f"Sending {frequency} digest to user {user_id}")
+                await asyncio.to_thread(self._send_user_digest, user_id, frequency, now)
+        
+        # SMTP sends block, so keep them off the event loop
+        results = await asyncio.gather(
+            *(run_one(user_id) for user_id in user_ids),
+            return_exceptions=True
+        )
+        for user_id, result in zip(user_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Error processing digest for user {user_id}: {result}")
 
 
 # Create a simple wrapper for FastAPI startup
@@ -117,4 +196,4 @@ scheduler = InsightScheduler()
 
 async def start_scheduler():
     """Start the scheduler in the background"""
-    asyncio.create_task(scheduler.start())
\ No newline at end of file
+    await scheduler.start()
\ No newline at end of file
@@ -8,11 +8,15 @@ import time
 import sys
 from datetime import date, timedelta
 import random
+from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "http://localhost:8000"
 TEST_USER = f"testuser_{int(time.time())}"
 TEST_PASS = "testpass123"
 
+# Shared session so every request reuses a keep-alive connection
+SESSION = requests.Session()
+
 def print_test(name, passed):
     """Print test result"""
     if passed:
@@ -45,7 +49,7 @@ def test_backend_health():
         # Wait for backend to start
         time.sleep(5)
         
-        response = requests.get(f"{BASE_URL}/")
+        response = SESSION.get(f"{BASE_URL}/")
         return response.status_code == 200, process
     except Exception as e:
         print(f"Backend health check failed: {e}")
@@ -54,7 +58,7 @@ def test_backend_health():
 def test_user_registration():
     """Test user registration"""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/register",
             data={"username": TEST_USER, "password": TEST_PASS}
         )
@@ -66,7 +70,7 @@ def test_user_registration():
 def test_user_login():
     """Test user login and get token"""
     try:
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/login",
             data={"username": TEST_USER, "password": TEST_PASS}
         )
@@ -82,7 +86,7 @@ def test_set_budget(token):
     """Test setting a budget goal"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/goal?amount=2000",
             headers=headers
         )
@@ -106,17 +110,14 @@ def test_add_transactions(token):
             {"tx_date": str(date.today() - timedelta(days=15)), "amount": -300, "label": "Entertainment", "notes": "Concert tickets - unusual!"},
         ]
         
-        success_count = 0
-        for tx in transactions:
-            response = requests.post(
-                f"{BASE_URL}/tx",
-                json=tx,
-                headers=headers
-            )
-            if response.status_code == 200:
-                success_count += 1
-                
-        return success_count == len(transactions)
+        def post_tx(tx):
+            return SESSION.post(f"{BASE_URL}/tx", json=tx, headers=headers).status_code
+        
+        # Independent inserts, so fire them in parallel
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(post_tx, transactions))
+        
+        return all(status == 200 for status in results)
     except Exception as e:
         print(f"Transaction creation failed: {e}")
         return False
@@ -125,7 +126,7 @@ def test_get_transactions(token):
     """Test retrieving transactions"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{BASE_URL}/tx", headers=headers)
+        response = SESSION.get(f"{BASE_URL}/tx", headers=headers)
         return response.status_code == 200 and len(response.json()) > 0
     except Exception as e:
         print(f"Transaction retrieval failed: {e}")
@@ -135,7 +136,7 @@ def test_generate_insights(token):
     """Test insight generation"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/insights/generate",
             headers=headers
         )
@@ -150,7 +151,7 @@ def test_get_insights(token):
         headers = {"Authorization": f"Bearer {token}"}
         # Wait a bit for insights to be generated
         time.sleep(2)
-        response = requests.get(f"{BASE_URL}/insights", headers=headers)
+        response = SESSION.get(f"{BASE_URL}/insights", headers=headers)
         if response.status_code == 200:
             insights = response.json()
             return len(insights) > 0
@@ -163,7 +164,7 @@ def test_health_score(token):
     """Test financial health score"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{BASE_URL}/insights/health-score", headers=headers)
+        response = SESSION.get(f"{BASE_URL}/insights/health-score", headers=headers)
         if response.status_code == 200:
             data = response.json()
             return "score" in data and 0 <= data["score"] <= 100
@@ -184,7 +185,7 @@ def test_analytics(token):
         ]
         
         for endpoint in endpoints:
-            response = requests.get(f"{BASE_URL}{endpoint}", headers=headers)
+            response = SESSION.get(f"{BASE_URL}{endpoint}", headers=headers)
             if response.status_code != 200:
                 return False
         return True
@@ -196,7 +197,7 @@ def test_what_if_scenario(token):
     """Test what-if scenario calculator"""
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(
+        response = SESSION.post(
             f"{BASE_URL}/insights/what-if",
             json={"category": "Food & Dining", "reduction_percentage": 20},
             headers=headers
@@ -214,12 +215,12 @@ def test_user_preferences(token):
     try:
         headers = {"Authorization": f"Bearer {token}"}
         # Get preferences
-        response = requests.get(f"{BASE_URL}/insights/preferences", headers=headers)
+        response = SESSION.get(f"{BASE_URL}/insights/preferences", headers=headers)
         if response.status_code != 200:
             return False
             
         # Update preferences
-        response = requests.put(
+        response = SESSION.put(
             f"{BASE_URL}/insights/preferences",
             json={"email_digest_frequency": "daily"},
             headers=headers
@@ -4,6 +4,9 @@
 # Use Railway's PORT or default to 8000
 export PORT=${PORT:-8000}
 
+# One worker process per (2 x CPU + 1) unless overridden
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-$(( $(nproc) * 2 + 1 ))}
+
 # Ensure DATABASE_URL uses absolute path for SQLite
 if [ -z "$DATABASE_URL" ] || [ "$DATABASE_URL" = "sqlite:///budgeteer.db" ]; then
     export DATABASE_URL="sqlite:////app/data/budgeteer.db"
@@ -18,12 +21,19 @@ fi
 echo "Starting CashBFF on port $PORT"
 echo "Using database: $DATABASE_URL"
 echo "Environment: ${RAILWAY_ENVIRONMENT:-development}"
+echo "Workers: $WEB_CONCURRENCY"
+
+# Create tables once here instead of in every worker's startup hook
+python migrate.py || exit 1
+export RUN_MIGRATIONS=0
 
 # Check if main_minimal.py exists (for simplified deployment)
 if [ -f "main_minimal.py" ]; then
     echo "Using minimal configuration"
-    exec uvicorn main_minimal:app --host 0.0.0.0 --port $PORT
+    exec uvicorn main_minimal:app --host 0.0.0.0 --port $PORT \
+        --loop uvloop --http httptools --workers $WEB_CONCURRENCY --no-access-log
 else
     # Start uvicorn with the regular main app
-    exec uvicorn main:app --host 0.0.0.0 --port $PORT
+    exec uvicorn main:app --host 0.0.0.0 --port $PORT \
+        --loop uvloop --http httptools --workers $WEB_CONCURRENCY --no-access-log
 fi
\ No newline at end of file
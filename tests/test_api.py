@@ -1,6 +1,5 @@
 import os
 import sys
-import tempfile
 import pytest
 
 # Ensure local packages (including a lightweight 'multipart' stub) are on the path
@@ -11,37 +10,48 @@ fp.multipart = multipart  # make FastAPI think python-multipart is installed
 
 from fastapi.testclient import TestClient
 from sqlmodel import SQLModel, create_engine, Session, select
+from sqlalchemy.pool import StaticPool
 import main
 import database
-import auth
 import transactions
 import forecast
-import analytics
+import dbmodels
+
+@pytest.fixture(scope="session")
+def test_engine():
+    # One shared in-memory connection, reachable from TestClient's threads;
+    # the schema is built once per run, and each xdist worker process gets
+    # its own private database
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    database.enable_sqlite_pragmas(engine)
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
 
 @pytest.fixture(autouse=True)
-def temp_db(monkeypatch):
-    fd, path = tempfile.mkstemp()
-    os.close(fd)
-    engine = create_engine(f"sqlite:///{path}")
-    # Patch all modules to use test engine
-    main.engine = engine
-    database.engine = engine
-    auth.engine = engine
-    transactions.engine = engine
-    forecast.engine = engine
-    analytics.engine = engine
-    monkeypatch.setattr(database, "engine", engine)
-    monkeypatch.setattr(auth, "engine", engine)
-    monkeypatch.setattr(transactions, "engine", engine)
-    monkeypatch.setattr(forecast, "engine", engine)
-    monkeypatch.setattr(analytics, "engine", engine)
-    SQLModel.metadata.create_all(engine)
+def temp_db(test_engine, monkeypatch):
+    # Every module reaches the engine through database.get_engine()
+    monkeypatch.setattr(database, "engine", test_engine)
     yield
-    os.remove(path)
-
-client = TestClient(main.app)
-
-def register_and_login(username="user", password="pass"):
+    # Empty every table rather than rebuilding the schema
+    with test_engine.begin() as conn:
+        for table in reversed(SQLModel.metadata.sorted_tables):
+            conn.execute(table.delete())
+
+@pytest.fixture(scope="session")
+def client(test_engine):
+    # Boot the app (and fire its startup/shutdown events) once for the whole
+    # run; test_engine already holds the schema, so startup skips create_all
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("RUN_MIGRATIONS", "0")
+        with TestClient(main.app) as c:
+            yield c
+
+def register_and_login(client, username="user", password="pass"):
     r = client.post("/register", data={"username": username, "password": password})
     assert r.status_code == 200
     r = client.post("/login", data={"username": username, "password": password})
@@ -49,13 +59,25 @@ def register_and_login(username="user", password="pass"):
     token = r.json()["token"]
     return {"Authorization": f"Bearer {token}"}
 
-def test_register_login():
-    headers = register_and_login()
+def test_health(client):
+    r = client.get("/health")
+    assert r.status_code == 200
+    assert r.json() == {"status": "healthy", "service": "budgeteer-api"}
+
+def test_register_login(client):
+    headers = register_and_login(client)
     r = client.get("/me", headers=headers)
     assert r.status_code == 200
 
-def test_add_tx_and_list():
-    headers = register_and_login("a", "b")
+def test_register_login_encoded_password(client):
+    headers = register_and_login(client, "enc", "p+ss%w=rd&x y")
+    r = client.get("/me", headers=headers)
+    assert r.status_code == 200
+    r = client.post("/login", data={"username": "enc", "password": "p ss%w=rd&x y"})
+    assert r.status_code == 401
+
+def test_add_tx_and_list(client):
+    headers = register_and_login(client, "a", "b")
     payload = {"tx_date": str(main.date.today()), "amount": 10.0, "label": "Food"}
     r = client.post("/tx", json=payload, headers=headers)
     assert r.status_code == 200
@@ -63,22 +85,22 @@ def test_add_tx_and_list():
     assert r.status_code == 200
     assert len(r.json()) == 1
 
-def test_add_tx_zero_amount():
-    headers = register_and_login("c", "d")
+def test_add_tx_zero_amount(client):
+    headers = register_and_login(client, "c", "d")
     payload = {"tx_date": str(main.date.today()), "amount": 0, "label": "Food"}
     r = client.post("/tx", json=payload, headers=headers)
     assert r.status_code == 422
 
 
-def test_add_tx_future_date():
-    headers = register_and_login("x", "y")
+def test_add_tx_future_date(client):
+    headers = register_and_login(client, "x", "y")
     tomorrow = main.date.today() + main.timedelta(days=1)
     payload = {"tx_date": str(tomorrow), "amount": 5.0, "label": "Food"}
     r = client.post("/tx", json=payload, headers=headers)
     assert r.status_code == 422
 
-def test_forecast():
-    headers = register_and_login("e", "f")
+def test_forecast(client):
+    headers = register_and_login(client, "e", "f")
     payload = {"tx_date": str(main.date.today()), "amount": 5.0, "label": "Food"}
     client.post("/tx", json=payload, headers=headers)
     r = client.get("/forecast", params={"days": 3}, headers=headers)
@@ -86,8 +108,8 @@ def test_forecast():
     assert len(r.json()) == 3
 
 
-def test_budget_goal():
-    headers = register_and_login("g", "h")
+def test_budget_goal(client):
+    headers = register_and_login(client, "g", "h")
     r = client.post("/goal", params={"amount": 100}, headers=headers)
     assert r.status_code == 200
     r = client.get("/goal", headers=headers)
@@ -95,8 +117,8 @@ def test_budget_goal():
     assert r.json()["amount"] == 100
 
 
-def test_budget_goal_new_month(monkeypatch):
-    headers = register_and_login("i", "j")
+def test_budget_goal_new_month(client, monkeypatch):
+    headers = register_and_login(client, "i", "j")
     # set goal for current month
     r = client.post("/goal", params={"amount": 100}, headers=headers)
     assert r.status_code == 200
@@ -121,14 +143,14 @@ def test_budget_goal_new_month(monkeypatch):
     assert r.status_code == 200
     assert r.json()["amount"] == 200
 
-    with Session(main.engine) as s:
+    with Session(database.get_engine()) as s:
         user = s.exec(select(main.User).where(main.User.username == "i")).first()
         goals = s.exec(select(main.BudgetGoal).where(main.BudgetGoal.user_id == user.id)).all()
         assert len(goals) == 2
 
 
-def test_toggle_recurring():
-    headers = register_and_login("t1", "pw")
+def test_toggle_recurring(client):
+    headers = register_and_login(client, "t1", "pw")
     payload = {"tx_date": str(main.date.today()), "amount": 10.0, "label": "Food"}
     r = client.post("/tx", json=payload, headers=headers)
     tx_id = r.json()["id"]
@@ -146,8 +168,30 @@ def test_toggle_recurring():
     assert len(r.json()) == 1
 
 
-def test_delete_recurring_series():
-    headers = register_and_login("del", "pw")
+def test_update_recurring_propagate(client):
+    headers = register_and_login(client, "prop", "pw")
+    start = main.date.today() - main.timedelta(days=10)
+    payload = {"tx_date": str(start), "amount": -20.0, "label": "Food", "recurring": True}
+    tx_id = client.post("/tx", json=payload, headers=headers).json()["id"]
+    before = sorted(t["tx_date"] for t in client.get("/tx", headers=headers).json())
+
+    moved = start + main.timedelta(days=2)
+    r = client.put(
+        f"/tx/{tx_id}",
+        params={"propagate": True},
+        json={**payload, "tx_date": str(moved), "amount": -25.0},
+        headers=headers,
+    )
+    assert r.status_code == 200
+    txs = sorted(client.get("/tx", headers=headers).json(), key=lambda t: t["tx_date"])
+    assert all(t["amount"] == -25.0 for t in txs)
+    expected = [
+        str(main.date.fromisoformat(d) + main.timedelta(days=2)) for d in before
+    ]
+    assert [t["tx_date"] for t in txs] == expected
+
+def test_delete_recurring_series(client):
+    headers = register_and_login(client, "del", "pw")
     payload = {"tx_date": str(main.date.today()), "amount": -5.0, "label": "Food", "recurring": True}
     r = client.post("/tx", json=payload, headers=headers)
     tx_id = r.json()["id"]
@@ -160,8 +204,8 @@ def test_delete_recurring_series():
     assert len(r.json()) == 0
 
 
-def test_change_password():
-    headers = register_and_login("chuser", "oldpw")
+def test_change_password(client):
+    headers = register_and_login(client, "chuser", "oldpw")
     r = client.post(
         "/change_password",
         json={"current_password": "oldpw", "new_password": "newpw"},
@@ -172,8 +216,8 @@ def test_change_password():
     assert r.status_code == 200
 
 
-def test_recurring_extension(monkeypatch):
-    headers = register_and_login("ext", "pw")
+def test_recurring_extension(client, monkeypatch):
+    headers = register_and_login(client, "ext", "pw")
     today = main.date.today()
     payload = {"tx_date": str(today), "amount": 5.0, "label": "Food", "recurring": True}
     client.post("/tx", json=payload, headers=headers)
@@ -193,3 +237,138 @@ def test_recurring_extension(monkeypatch):
 
     r = client.get("/tx", headers=headers)
     assert len(r.json()) == 6
+
+
+def test_recurring_expenses(client):
+    headers = register_and_login(client, "rec", "pw")
+    today = main.date.today()
+    payload = {"tx_date": str(today), "amount": -12.5, "label": "Food & Dining",
+               "notes": "Meal plan", "recurring": True}
+    client.post("/tx", json=payload, headers=headers)
+
+    r = client.get("/recurring/expenses", headers=headers)
+    assert r.status_code == 200
+    expenses = r.json()
+    assert len(expenses) == 1
+    expense = expenses[0]
+    assert expense["name"] == "Meal plan"
+    assert expense["amount"] == 12.5
+    assert expense["category"] == "fooddining"
+    assert expense["frequency"] == "monthly"
+    assert expense["next_date"] == str(today)
+    assert expense["is_active"] is True
+
+    r = client.get("/recurring/stats", headers=headers)
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["active_count"] == 1
+    assert stats["paused_count"] == 0
+    assert stats["total_monthly"] == 12.5
+    assert stats["by_category"] == {"fooddining": 12.5}
+    assert [e["series_id"] for e in stats["upcoming_week"]] == [expense["series_id"]]
+
+
+def test_recurring_toggle_and_delete(client):
+    headers = register_and_login(client, "rec2", "pw")
+    start = main.date.today() - main.timedelta(days=40)
+    payload = {"tx_date": str(start), "amount": -9.99, "label": "Entertainment", "recurring": True}
+    client.post("/tx", json=payload, headers=headers)
+    series_id = client.get("/recurring/expenses", headers=headers).json()[0]["series_id"]
+
+    # Pausing removes the upcoming payments
+    r = client.patch(f"/recurring/expenses/{series_id}/toggle", headers=headers)
+    assert r.status_code == 200
+    expense = client.get("/recurring/expenses", headers=headers).json()[0]
+    assert expense["is_active"] is False
+    stats = client.get("/recurring/stats", headers=headers).json()
+    assert stats["active_count"] == 0
+    assert stats["paused_count"] == 1
+    assert stats["total_monthly"] == 0
+
+    # Resuming schedules three more months after the latest payment
+    r = client.patch(f"/recurring/expenses/{series_id}/toggle", headers=headers)
+    assert r.status_code == 200
+    expense = client.get("/recurring/expenses", headers=headers).json()[0]
+    assert expense["is_active"] is True
+    assert expense["next_date"] > str(main.date.today())
+
+    r = client.delete(f"/recurring/expenses/{series_id}", headers=headers)
+    assert r.status_code == 200
+    assert r.json() == {"status": "deleted", "count": 5}
+    assert client.get("/recurring/expenses", headers=headers).json() == []
+
+    r = client.delete(f"/recurring/expenses/{series_id}", headers=headers)
+    assert r.status_code == 404
+    r = client.patch(f"/recurring/expenses/{series_id}/toggle", headers=headers)
+    assert r.status_code == 404
+
+
+def test_peer_comparison(client):
+    users = []
+    for i in range(1, 6):
+        headers = register_and_login(client, f"peer{i}", "pw")
+        payload = {"tx_date": str(main.date.today()), "amount": -10.0 * i, "label": "food"}
+        client.post("/tx", json=payload, headers=headers)
+        if i < 5:  # too few peers for a benchmark
+            payload = {"tx_date": str(main.date.today()), "amount": -5.0, "label": "health"}
+            client.post("/tx", json=payload, headers=headers)
+        users.append(headers)
+
+    r = client.get("/insights/peer-comparison", headers=users[0])
+    assert r.status_code == 200
+    comparisons = r.json()["comparisons"]
+    assert len(comparisons) == 1
+    food = comparisons[0]
+    assert food["category"] == "food"
+    assert food["peer_median"] == 30.0
+    assert food["status"] == "excellent"
+    assert food["percentile"] == 0.0
+
+    # Recomputing updates the existing benchmark rather than duplicating it
+    client.post("/tx", json={"tx_date": str(main.date.today()), "amount": -100.0, "label": "food"}, headers=users[4])
+    r = client.get("/insights/peer-comparison", headers=users[0])
+    assert r.json()["comparisons"][0]["peer_median"] == 30.0
+    with Session(database.get_engine()) as s:
+        benchmarks = s.exec(select(dbmodels.SpendingBenchmark)).all()
+        assert len(benchmarks) == 1
+        assert benchmarks[0].benchmark_data["max"] == 150.0
+
+    r = client.get("/insights/savings-opportunities", headers=users[4])
+    assert r.status_code == 200
+    opportunities = r.json()["opportunities"]
+    assert [o["category"] for o in opportunities] == ["food"]
+    assert opportunities[0]["potential_monthly_savings"] == 120.0
+    assert opportunities[0]["potential_annual_savings"] == 1440.0
+
+    r = client.get("/insights/savings-opportunities", headers=users[0])
+    assert r.json()["opportunities"] == []
+
+
+def test_upgrade_schema_adds_missing_columns():
+    import migrate
+    from sqlalchemy import inspect, text
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE userpreferences (id INTEGER PRIMARY KEY, user_id INTEGER)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE spendingbenchmark "
+            "(id INTEGER PRIMARY KEY, category VARCHAR, user_demographic VARCHAR)"
+        ))
+        conn.execute(text(
+            "INSERT INTO spendingbenchmark (category, user_demographic) "
+            "VALUES ('food', 'all_users'), ('food', 'all_users')"
+        ))
+    migrate.upgrade_schema(engine)
+    migrate.upgrade_schema(engine)  # idempotent
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("userpreferences")}
+    assert "last_digest_sent_at" in columns
+    assert any(
+        i["unique"] and set(i["column_names"]) == {"category", "user_demographic"}
+        for i in inspector.get_indexes("spendingbenchmark")
+    )
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM spendingbenchmark")).scalar() == 1
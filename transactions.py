@@ -1,9 +1,9 @@
 from datetime import datetime, timedelta, date
 import os
-import pandas as pd
-from typing import List
+from typing import List, Optional
+from dateutil.relativedelta import relativedelta
 from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select, create_engine
+from sqlmodel import Session, select, create_engine, insert, delete, update, func, case, and_
 import logging
 
 from dbmodels import Tx
@@ -11,47 +11,71 @@ from schemas import TxIn
 from auth import get_current_user
 
 # Import shared engine to avoid circular import
-from database import engine
+from database import get_engine
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-def _extend_recurring(user, s: Session, months: int = 3) -> None:
-    today = date.today()
-    series_ids = s.exec(
-        select(Tx.series_id)
-        .where(Tx.user_id == user.id, Tx.recurring == True, Tx.series_id != None)
-        .distinct()
+def _future_recurring_rows(base, series_id: int, user_id: int, n: int = 3) -> List[dict]:
+    """Rows for the next ``n`` monthly payments after ``base``, ready for a bulk insert."""
+    return [
+        {
+            "tx_date": base.tx_date + relativedelta(months=i),
+            "amount": base.amount,
+            "label": base.label,
+            "notes": base.notes,
+            "recurring": True,
+            "user_id": user_id,
+            "series_id": series_id,
+        }
+        for i in range(1, n + 1)
+    ]
+
+
+def _extend_recurring(user, s: Session, months: int = 3, today: Optional[date] = None) -> None:
+    today = today or date.today()
+    series_filter = and_(Tx.user_id == user.id, Tx.recurring == True, Tx.series_id != None)
+    future_count = func.sum(case((Tx.tx_date > today, 1), else_=0))
+    # Series short of future rows; empty in the common case, so reads don't write
+    short = (
+        select(Tx.series_id, future_count.label("future_count"))
+        .where(series_filter)
+        .group_by(Tx.series_id)
+        .having(future_count < months)
+        .subquery()
+    )
+    # Latest row of each series, which the new payments copy
+    latest = (
+        select(
+            Tx.series_id,
+            Tx.tx_date,
+            Tx.amount,
+            Tx.label,
+            Tx.notes,
+            func.row_number().over(
+                partition_by=Tx.series_id,
+                order_by=(Tx.tx_date.desc(), Tx.id.desc()),
+            ).label("rn"),
+        )
+        .where(series_filter)
+        .subquery()
+    )
+    rows = s.exec(
+        select(latest, short.c.future_count)
+        .join(short, short.c.series_id == latest.c.series_id)
+        .where(latest.c.rn == 1)
     ).all()
-    for sid in series_ids:
-        txs = (
-            s.exec(
-                select(Tx)
-                .where(Tx.series_id == sid, Tx.user_id == user.id)
-                .order_by(Tx.tx_date)
-            ).all()
+    new_rows = [
+        new_row
+        for row in rows
+        for new_row in _future_recurring_rows(
+            row, row.series_id, user.id, n=months - row.future_count
         )
-        if not txs:
-            continue
-        future_count = len([t for t in txs if t.tx_date > today])
-        last_tx = txs[-1]
-        last_date = last_tx.tx_date
-        while future_count < months:
-            last_date = (pd.Timestamp(last_date) + pd.DateOffset(months=1)).date()
-            future_tx = Tx(
-                tx_date=last_date,
-                amount=last_tx.amount,
-                label=last_tx.label,
-                notes=last_tx.notes,
-                recurring=True,
-                user_id=user.id,
-                series_id=sid,
-            )
-            s.add(future_tx)
-            last_tx = future_tx
-            future_count += 1
-    if series_ids:
+    ]
+    if new_rows:
+        # One executemany INSERT for every series that needed topping up
+        s.execute(insert(Tx), new_rows)
         s.commit()
 
 
@@ -59,21 +83,10 @@ def _extend_recurring(user, s: Session, months: int = 3) -> None:
 def add_tx(tx_in: TxIn, user=Depends(get_current_user)) -> Tx:
     series_id = int(datetime.utcnow().timestamp()) if tx_in.recurring else None
     tx = Tx(**tx_in.dict(), user_id=user.id, series_id=series_id)
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         s.add(tx)
         if tx_in.recurring:
-            for i in range(1, 4):
-                future_date = (pd.Timestamp(tx_in.tx_date) + pd.DateOffset(months=i)).date()
-                future_tx = Tx(
-                    tx_date=future_date,
-                    amount=tx_in.amount,
-                    label=tx_in.label,
-                    notes=tx_in.notes,
-                    recurring=True,
-                    user_id=user.id,
-                    series_id=series_id,
-                )
-                s.add(future_tx)
+            s.execute(insert(Tx), _future_recurring_rows(tx_in, series_id, user.id))
         s.commit()
         s.refresh(tx)
         return tx
@@ -81,12 +94,12 @@ def add_tx(tx_in: TxIn, user=Depends(get_current_user)) -> Tx:
 
 @router.get("/tx", response_model=List[Tx])
 def list_tx(exclude_future: bool = False, user=Depends(get_current_user)) -> List[Tx]:
-    with Session(engine) as s:
-        _extend_recurring(user, s)
+    today = date.today()
+    with Session(get_engine()) as s:
+        _extend_recurring(user, s, today=today)
         stmt = select(Tx).where(Tx.user_id == user.id)
         
         if exclude_future:
-            today = date.today()
             stmt = stmt.where(Tx.tx_date <= today)
         
         stmt = stmt.order_by(Tx.tx_date.desc())
@@ -95,34 +108,21 @@ def list_tx(exclude_future: bool = False, user=Depends(get_current_user)) -> Lis
 
 @router.put("/tx/{tx_id}", response_model=Tx)
 def update_tx(tx_id: int, tx_in: TxIn, propagate: bool = False, user=Depends(get_current_user)) -> Tx:
-    with Session(engine) as s:
+    new_series = int(datetime.utcnow().timestamp())
+    with Session(get_engine()) as s:
         tx = s.get(Tx, tx_id)
         if not tx or tx.user_id != user.id:
             raise HTTPException(status_code=404, detail="Not found")
         if tx.recurring and not tx_in.recurring:
-            stmt = select(Tx).where(
+            s.exec(delete(Tx).where(
                 Tx.series_id == tx.series_id,
                 Tx.user_id == user.id,
                 Tx.tx_date > tx.tx_date,
-            )
-            for f in s.exec(stmt).all():
-                s.delete(f)
+            ))
             tx.series_id = None
         elif tx_in.recurring and not tx.recurring:
-            new_series = int(datetime.utcnow().timestamp())
             tx.series_id = new_series
-            for i in range(1, 4):
-                future_date = (pd.Timestamp(tx_in.tx_date) + pd.DateOffset(months=i)).date()
-                future_tx = Tx(
-                    tx_date=future_date,
-                    amount=tx_in.amount,
-                    label=tx_in.label,
-                    notes=tx_in.notes,
-                    recurring=True,
-                    user_id=user.id,
-                    series_id=new_series,
-                )
-                s.add(future_tx)
+            s.execute(insert(Tx), _future_recurring_rows(tx_in, new_series, user.id))
         old_date = tx.tx_date
         delta = tx_in.tx_date - old_date
         tx.tx_date = tx_in.tx_date
@@ -131,17 +131,27 @@ def update_tx(tx_id: int, tx_in: TxIn, propagate: bool = False, user=Depends(get
         tx.notes = tx_in.notes
         tx.recurring = tx_in.recurring
         if propagate and tx.series_id and tx.recurring:
-            stmt = select(Tx).where(
-                Tx.series_id == tx.series_id,
-                Tx.user_id == user.id,
-                Tx.tx_date > old_date,
+            # Shift the later rows of the series in one UPDATE
+            if s.get_bind().dialect.name == "sqlite":
+                shifted_date = func.date(Tx.tx_date, f"{delta.days:+d} days")
+            else:
+                shifted_date = Tx.tx_date + delta.days
+            s.exec(
+                update(Tx)
+                .where(
+                    Tx.series_id == tx.series_id,
+                    Tx.user_id == user.id,
+                    Tx.tx_date > old_date,
+                    Tx.id != tx.id,
+                )
+                .values(
+                    amount=tx_in.amount,
+                    label=tx_in.label,
+                    notes=tx_in.notes,
+                    tx_date=shifted_date,
+                )
+                .execution_options(synchronize_session=False)
             )
-            for f in s.exec(stmt).all():
-                f.amount = tx_in.amount
-                f.label = tx_in.label
-                f.notes = tx_in.notes
-                f.tx_date = f.tx_date + delta
-                s.add(f)
         s.add(tx)
         s.commit()
         s.refresh(tx)
@@ -150,18 +160,16 @@ def update_tx(tx_id: int, tx_in: TxIn, propagate: bool = False, user=Depends(get
 
 @router.delete("/tx/{tx_id}", status_code=204)
 def delete_tx(tx_id: int, user=Depends(get_current_user)) -> None:
-    with Session(engine) as s:
+    with Session(get_engine()) as s:
         tx = s.get(Tx, tx_id)
         if not tx or tx.user_id != user.id:
             raise HTTPException(status_code=404, detail="Not found")
         if tx.series_id:
-            stmt = select(Tx).where(
+            s.exec(delete(Tx).where(
                 Tx.series_id == tx.series_id,
                 Tx.user_id == user.id,
                 Tx.tx_date >= tx.tx_date,
-            )
-            for f in s.exec(stmt).all():
-                s.delete(f)
+            ))
         else:
             s.delete(tx)
         s.commit()
@@ -169,13 +177,14 @@ def delete_tx(tx_id: int, user=Depends(get_current_user)) -> None:
 
 @router.get("/reminders", response_model=List[Tx])
 def get_reminders(days: int = 30, user=Depends(get_current_user)) -> List[Tx]:
-    cutoff = date.today() + timedelta(days=days)
-    with Session(engine) as s:
-        _extend_recurring(user, s)
+    today = date.today()
+    cutoff = today + timedelta(days=days)
+    with Session(get_engine()) as s:
+        _extend_recurring(user, s, today=today)
         stmt = select(Tx).where(
             Tx.user_id == user.id,
             Tx.recurring == True,
-            Tx.tx_date > date.today(),
+            Tx.tx_date > today,
             Tx.tx_date <= cutoff,
         )
         return s.exec(stmt).all()